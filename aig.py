@@ -0,0 +1,315 @@
+import heapq
+
+from bool_types import *
+
+# Literals are integers: node index shifted left by one, the lowest bit marks complemented edge.
+# Node 0 is the constant, so literal 0 is false and literal 1 is true.
+FALSE, TRUE = 0, 1
+
+
+class AIG:
+    """
+    And-Inverter Graph: every formula is represented by two-input AND nodes and complemented edges.
+
+    Nodes are stored in topological order and identified by literals (see FALSE and TRUE above).
+    Structural hashing guarantees that the same AND of the same literals is created only once.
+    If rewrite is set, some local two-level rules are applied every time an AND node is requested.
+    """
+    def __init__(self, rewrite=True):
+        self.rewrite = rewrite
+        # fanins[i] is the pair of literals for AND nodes and None for the constant and variables.
+        self.fanins = [None]
+        self.variables = [None]
+        self.levels = [0]
+        self.inputs = {}
+        self.strash = {}
+
+    def __len__(self):
+        """
+        Returns the number of AND nodes in the graph.
+        """
+        return len(self.strash)
+
+    def _new_node(self, fanins, variable=None, level=0):
+        self.fanins.append(fanins)
+        self.variables.append(variable)
+        self.levels.append(level)
+        return 2 * (len(self.fanins) - 1)
+
+    def level(self, literal):
+        """
+        Returns the length of the longest path from the given literal to the inputs.
+        """
+        return self.levels[literal >> 1]
+
+    def variable(self, term):
+        """
+        Returns the literal for the given Variable, creating an input node if necessary.
+        """
+        literal = self.inputs.get(term)
+        if literal is None:
+            literal = self.inputs[term] = self._new_node(None, term)
+        return literal
+
+    def conjunction(self, a, b):
+        if a > b:
+            a, b = b, a
+        if a == FALSE or a == b ^ 1:
+            return FALSE
+        if a == TRUE or a == b:
+            return b
+        if self.rewrite:
+            result = self._rewrite(a, b)
+            if result is not None:
+                return result
+        literal = self.strash.get((a, b))
+        if literal is None:
+            level = 1 + max(self.level(a), self.level(b))
+            literal = self.strash[a, b] = self._new_node((a, b), level=level)
+        return literal
+
+    def disjunction(self, a, b):
+        return self.conjunction(a ^ 1, b ^ 1) ^ 1
+
+    def implication(self, a, b):
+        return self.conjunction(a, b ^ 1) ^ 1
+
+    def _rewrite(self, a, b):
+        """
+        Applies two-level rules to the AND of literals a and b.
+        Returns equivalent literal or None if no rule is applicable.
+        """
+        for x, y in ((a, b), (b, a)):
+            x_fanins = self.fanins[x >> 1]
+            if x_fanins is None:
+                continue
+            x0, x1 = x_fanins
+            y_fanins = self.fanins[y >> 1] if not y & 1 else None
+            if not x & 1:
+                # (x0 & x1) & ~x0 = 0
+                if y == x0 ^ 1 or y == x1 ^ 1:
+                    return FALSE
+                # (x0 & x1) & x0 = x0 & x1
+                if y == x0 or y == x1:
+                    return x
+                # (x0 & x1) & (~x0 & y1) = 0
+                if y_fanins is not None and (x0 ^ 1 in y_fanins or x1 ^ 1 in y_fanins):
+                    return FALSE
+            else:
+                # ~(x0 & x1) & ~x0 = ~x0
+                if y == x0 ^ 1 or y == x1 ^ 1:
+                    return y
+                # ~(x0 & x1) & x0 = x0 & ~x1
+                if y == x0:
+                    return self.conjunction(y, x1 ^ 1)
+                if y == x1:
+                    return self.conjunction(y, x0 ^ 1)
+                if y_fanins is not None:
+                    # ~(x0 & x1) & (x0 & x1 & ...) = 0
+                    if x0 in y_fanins and x1 in y_fanins:
+                        return FALSE
+                    # ~(x0 & x1) & (~x0 & y1) = ~x0 & y1
+                    if x0 ^ 1 in y_fanins or x1 ^ 1 in y_fanins:
+                        return y
+        return None
+
+    def build(self, tree):
+        """
+        Adds the given formula to the graph and returns its literal.
+        The tree is traversed without recursion, shared subformulas are processed once.
+        """
+        memo = {}
+        values = []
+        stack = [(tree, False)]
+        while stack:
+            node, expanded = stack.pop()
+            if isinstance(node, CustomBool):
+                values.append(TRUE if node else FALSE)
+            elif isinstance(node, Variable):
+                values.append(self.variable(node))
+            elif id(node) in memo:
+                values.append(memo[id(node)][1])
+            elif not expanded:
+                stack.append((node, True))
+                if isinstance(node, NegationOperator):
+                    stack.append((node.value, False))
+                elif isinstance(node, BinaryOperator):
+                    stack.append((node.right, False))
+                    stack.append((node.left, False))
+                else:
+                    raise TypeError
+            else:
+                if isinstance(node, NegationOperator):
+                    literal = values.pop() ^ 1
+                else:
+                    right = values.pop()
+                    left = values.pop()
+                    literal = self._combine(node, left, right)
+                # Keep the node itself alive, so its id cannot be reused during traversal.
+                memo[id(node)] = (node, literal)
+                values.append(literal)
+        return values.pop()
+
+    def _combine(self, node, left, right):
+        if isinstance(node, BinaryConjunction):
+            return self.conjunction(left, right)
+        elif isinstance(node, BinaryDisjunction):
+            return self.disjunction(left, right)
+        elif isinstance(node, BinaryImplication):
+            return self.implication(left, right)
+        raise TypeError
+
+    def cone(self, literal):
+        """
+        Returns sorted list of indices of nodes reachable from the given literal (constant excluded).
+        Since nodes are stored in topological order, fanins precede their fanouts in this list.
+        """
+        reachable = set()
+        stack = [literal >> 1]
+        while stack:
+            index = stack.pop()
+            if index == 0 or index in reachable:
+                continue
+            reachable.add(index)
+            fanins = self.fanins[index]
+            if fanins is not None:
+                stack.extend(fanin >> 1 for fanin in fanins)
+        return sorted(reachable)
+
+    def size(self, literal):
+        """
+        Returns the number of AND nodes reachable from the given literal.
+        """
+        return sum(self.fanins[index] is not None for index in self.cone(literal))
+
+    def copy(self, literal, rewrite=True):
+        """
+        Copies the cone of the given literal into new graph, dropping unreachable nodes.
+        If rewrite is set, local rewriting rules are applied to every node during the copy.
+        Returns pair of the new graph and the literal in it.
+        """
+        graph = AIG(rewrite)
+        mapping = {0: FALSE}
+        for index in self.cone(literal):
+            fanins = self.fanins[index]
+            if fanins is None:
+                mapping[index] = graph.variable(self.variables[index])
+            else:
+                left, right = fanins
+                mapping[index] = graph.conjunction(mapping[left >> 1] ^ (left & 1),
+                                                   mapping[right >> 1] ^ (right & 1))
+        return graph, mapping[literal >> 1] ^ (literal & 1)
+
+    def balance(self, literal):
+        """
+        Rebuilds the cone of the given literal, replacing chains of conjunctions with balanced trees.
+        Every AND node that has a single non-complemented fanout is merged into its fanout,
+        leaves of the resulting multi-input conjunction are combined starting from the shallowest ones.
+        Returns pair of the new graph and the literal in it.
+        """
+        cone = self.cone(literal)
+        references = dict.fromkeys(cone, 0)
+        roots = {literal >> 1}
+        for index in cone:
+            for fanin in self.fanins[index] or ():
+                if fanin >> 1 in references:
+                    references[fanin >> 1] += 1
+                    if fanin & 1:
+                        roots.add(fanin >> 1)
+        roots.update(index for index, count in references.items() if count > 1)
+
+        graph = AIG(self.rewrite)
+        mapping = {0: FALSE}
+        for index in cone:
+            fanins = self.fanins[index]
+            if fanins is None:
+                mapping[index] = graph.variable(self.variables[index])
+            elif index in roots:
+                leaves = []
+                stack = list(fanins)
+                while stack:
+                    fanin = stack.pop()
+                    if fanin & 1 or fanin >> 1 in roots or self.fanins[fanin >> 1] is None:
+                        leaves.append(mapping[fanin >> 1] ^ (fanin & 1))
+                    else:
+                        stack.extend(self.fanins[fanin >> 1])
+                mapping[index] = graph._balanced_conjunction(leaves)
+        return graph, mapping[literal >> 1] ^ (literal & 1)
+
+    def _balanced_conjunction(self, leaves):
+        leaves = set(leaves)
+        if any(leaf ^ 1 in leaves for leaf in leaves):
+            return FALSE
+        heap = [(self.level(leaf), leaf) for leaf in leaves]
+        heapq.heapify(heap)
+        while len(heap) > 1:
+            _, a = heapq.heappop(heap)
+            _, b = heapq.heappop(heap)
+            result = self.conjunction(a, b)
+            heapq.heappush(heap, (self.level(result), result))
+        return heap[0][1] if heap else TRUE
+
+    def to_node(self, literal):
+        """
+        Converts the cone of the given literal back to the Node formula.
+        For every AND node both its positive and negative forms are built, choosing the smallest of
+        x /\\ y, ~x \\/ ~y, x -> ~y and y -> ~x or their negations, so the result stays compact.
+        """
+        # forms[index] is the pair of formulas equivalent to the node and its negation,
+        # sizes[index] are the sizes of these formulas.
+        forms = {0: (CustomBool(False), CustomBool(True))}
+        sizes = {0: (1, 1)}
+
+        def formula(fanin):
+            return forms[fanin >> 1][fanin & 1]
+
+        def weight(fanin):
+            return sizes[fanin >> 1][fanin & 1]
+
+        for index in self.cone(literal):
+            fanins = self.fanins[index]
+            if fanins is None:
+                variable = self.variables[index]
+                forms[index] = (variable, NegationOperator(variable))
+                sizes[index] = (1, 2)
+                continue
+            left, right = fanins
+            conjunction = 1 + weight(left) + weight(right)
+            # ~(x /\ y) may be written as a disjunction or as an implication in either direction.
+            duals = [
+                1 + weight(left ^ 1) + weight(right ^ 1),
+                1 + weight(left) + weight(right ^ 1),
+                1 + weight(right) + weight(left ^ 1),
+            ]
+            dual = min(duals)
+            if dual == duals[0]:
+                dual_form = BinaryDisjunction(formula(left ^ 1), formula(right ^ 1))
+            elif dual == duals[1]:
+                dual_form = BinaryImplication(formula(left), formula(right ^ 1))
+            else:
+                dual_form = BinaryImplication(formula(right), formula(left ^ 1))
+
+            if conjunction <= 1 + dual:
+                positive = BinaryConjunction(formula(left), formula(right))
+                sizes[index] = (conjunction, min(dual, 1 + conjunction))
+            else:
+                positive = NegationOperator(dual_form)
+                sizes[index] = (1 + dual, dual)
+            negative = dual_form if dual <= 1 + conjunction else NegationOperator(positive)
+            forms[index] = (positive, negative)
+        return formula(literal)
+
+
+def simplify(tree, rewrite=True, balance=True):
+    """
+    Reduces the given formula by lowering it to And-Inverter Graph,
+    running rewriting and balancing passes and converting the result back to Node.
+    The returned formula is equivalent to the given one and may be passed to to_CNF and to_DNF.
+    """
+    graph = AIG(rewrite)
+    literal = graph.build(tree)
+    if rewrite:
+        graph, literal = graph.copy(literal)
+    if balance:
+        graph, literal = graph.balance(literal)
+    return graph.to_node(literal)
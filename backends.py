@@ -0,0 +1,114 @@
+from aig import simplify
+from bool_types import *
+from convertation import KINDS, UNKNOWN, CONVERTERS as SHANNON_CONVERTERS
+from decomposition import MAIN_OPERATORS, components, variables, \
+    to_CNF_components, to_DNF_components, to_normal_forms_components
+from exceptions import BudgetExceeded
+
+# Available conversion backends:
+# 'shannon' expands the whole formula as is,
+# 'components' converts variable-disjoint parts independently (see decomposition),
+# 'aig' reduces the formula with And-Inverter Graph first and then converts it by components.
+BACKENDS = ('shannon', 'components', 'aig')
+
+CONVERTERS = {
+    'shannon': SHANNON_CONVERTERS,
+    'components': {'CNF': to_CNF_components, 'DNF': to_DNF_components, 'both': to_normal_forms_components},
+}
+
+
+def size(tree):
+    """
+    Returns the number of operators, variables and constants in the given formula.
+    Shared subformulas are counted as many times as they occur, but visited only once.
+    """
+    sizes = {}
+    stack = [(tree, False)]
+    while stack:
+        node, expanded = stack.pop()
+        if id(node) in sizes:
+            continue
+        if isinstance(node, NegationOperator):
+            children = [node.value]
+        elif isinstance(node, BinaryOperator):
+            children = [node.left, node.right]
+        else:
+            children = []
+        if expanded or not children:
+            # The node itself is stored to keep its id valid.
+            sizes[id(node)] = (node, 1 + sum(sizes[id(child)][1] for child in children))
+        else:
+            stack.append((node, True))
+            stack += [(child, False) for child in children]
+    return sizes[id(tree)][1]
+
+
+def estimate_cost(tree):
+    """
+    Estimates work of the Shannon expansion of the given formula:
+    every of 2^n cofactors is built by substitution into the formula of the given size.
+    """
+    return size(tree) << len(variables(tree))
+
+
+def estimate_components_cost(tree, kind='both'):
+    """
+    Estimates work of the conversion by components as the total cost of the top-level components
+    plus the size of the product that joins their results when it is needed for the given kind.
+    A component with n variables has at most 2^n clauses, so the product is bounded by their product.
+    """
+    costs = []
+    for cls in (BinaryConjunction, BinaryDisjunction):
+        parts = components(tree, cls)
+        cost = sum(estimate_cost(part) for part, _ in parts)
+        if len(parts) > 1 and (kind == 'both' or MAIN_OPERATORS[kind] is not cls):
+            cost += 1 << sum(len(part_variables) for _, part_variables in parts)
+        costs.append(cost)
+    return min(costs)
+
+
+def select_backend(tree, kind='both'):
+    """
+    Returns pair of the backend with the least estimated cost of building the given kind of normal form
+    and the formula to convert: for 'aig' it is already reduced, so it should not be simplified again.
+    Simpler backends are preferred if estimations are equal.
+    """
+    simplified = simplify(tree)
+    costs = {
+        'shannon': estimate_cost(tree),
+        'components': estimate_components_cost(tree, kind),
+        'aig': estimate_components_cost(simplified, kind),
+    }
+    backend = min(BACKENDS, key=costs.get)
+    return backend, simplified if backend == 'aig' else tree
+
+
+def convert(tree, kind='both', backend='auto', budget=None, partial=False):
+    """
+    Converts the given formula to 'CNF', 'DNF' or 'both' (the pair (DNF, CNF) like to_normal_forms).
+
+    backend is one of BACKENDS or 'auto' to pick the cheapest one using select_backend.
+    If budget is given and exceeded, raises BudgetExceeded.
+    If partial is set, returns the pair (result, complete) instead: when the budget is exceeded,
+    complete is False and result holds what was found so far (see to_CNF and to_DNF).
+    Only 'shannon' backend collects partial results; others raise BudgetExceeded even if partial is set.
+    """
+    if kind not in KINDS:
+        raise ValueError('Unknown normal form: {}'.format(kind))
+    if backend == 'auto':
+        backend, tree = select_backend(tree, kind)
+    elif backend == 'aig':
+        tree = simplify(tree)
+    if backend == 'aig':
+        backend = 'components'
+    if backend not in CONVERTERS:
+        raise ValueError('Unknown backend: {}'.format(backend))
+
+    if not partial:
+        return CONVERTERS[backend][kind](tree, budget=budget)
+    try:
+        return CONVERTERS[backend][kind](tree, budget=budget), True
+    except BudgetExceeded as ex:
+        if backend != 'shannon':
+            raise
+        return UNKNOWN[kind] if ex.partial is None else ex.partial, False
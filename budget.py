@@ -0,0 +1,46 @@
+import time
+
+from exceptions import BudgetExceeded
+
+
+class Budget:
+    """
+    Limits resources that a conversion may use. Every limit is optional:
+    max_clauses bounds the number of clauses in any intermediate result,
+    max_depth bounds the number of nested expansions,
+    max_nodes bounds the total number of expanded cofactors and clauses built by joining components,
+    timeout bounds wall-clock time in seconds since the budget was created.
+
+    The budget is consumed: pass a new instance to every independent conversion
+    (to_CNF, to_DNF, to_normal_forms, their decomposition variants or backends.convert).
+    When a budget is sent to worker processes, each of them counts nodes separately.
+    """
+    def __init__(self, max_clauses=None, max_depth=None, max_nodes=None, timeout=None):
+        self.max_clauses = max_clauses
+        self.max_depth = max_depth
+        self.max_nodes = max_nodes
+        self.timeout = timeout
+        self.deadline = None if timeout is None else time.monotonic() + timeout
+        self.nodes = 0
+
+    def step(self, depth):
+        """
+        Accounts one expanded cofactor at the given depth and checks node, depth and time limits.
+        """
+        if self.max_depth is not None and depth > self.max_depth:
+            raise BudgetExceeded('depth', self.max_depth)
+        self.spend(1)
+
+    def spend(self, count):
+        """
+        Accounts count units of work (cofactors or built clauses) and checks node and time limits.
+        """
+        self.nodes += count
+        if self.max_nodes is not None and self.nodes > self.max_nodes:
+            raise BudgetExceeded('nodes', self.max_nodes)
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            raise BudgetExceeded('timeout', self.timeout)
+
+    def check_clauses(self, count, partial=None):
+        if self.max_clauses is not None and count > self.max_clauses:
+            raise BudgetExceeded('clauses', self.max_clauses, partial)
@@ -1,38 +1,117 @@
 from bool_types import *
+from exceptions import BudgetExceeded
 
+# Kinds of normal forms: 'both' stands for the pair (DNF, CNF) like to_normal_forms returns.
+KINDS = ('CNF', 'DNF', 'both')
 
-def to_CNF(tree):
+# Results that carry no information: an empty CNF is true, an empty DNF is false.
+# They stand for branches that were not expanded when the budget is exceeded.
+UNKNOWN = {'CNF': True, 'DNF': False, 'both': (False, True)}
+
+
+def to_CNF(tree, budget=None):
     """
     Builds CNF for the given formula and returns it as the set of sets.
     Computing CNF uses the following equality:
     A(x, y) = (x \/ A(0, y)) /\ (~x \/ A(1, y))
     where y may be boolean vector (y_1, ..., y_k)
+
+    If budget is given and exceeded, raises BudgetExceeded with the clauses found so far as its partial result.
+    Partial CNF is implied by the formula, but in general is not equivalent to it.
+    """
+    return _expand(tree, 'CNF', budget)
+
+
+def to_DNF(tree, budget=None):
+    """
+    Builds DNF for the given formula and returns it as the set of sets.
+    Computing DNF uses the following equality:
+    A(x, y) = (x /\ A(1, y)) \/ (~x /\ A(0, y))
+    where y may be boolean vector (y_1, ..., y_k)
+
+    If budget is given and exceeded, raises BudgetExceeded with the terms found so far as its partial result.
+    Partial DNF implies the formula, but in general is not equivalent to it.
+    """
+    return _expand(tree, 'DNF', budget)
+
+
+def to_normal_forms(tree, budget=None):
+    """
+    Builds both DNF and CNF for the given formula and returns them as the pair (DNF, CNF).
+    Both forms are collected during the single expansion, so every cofactor A(0, y) and A(1, y)
+    is built once instead of twice for separate to_DNF and to_CNF calls.
+    See to_CNF and to_DNF for the meaning of budget and partial results.
+    """
+    return _expand(tree, 'both', budget)
+
+
+CONVERTERS = {'CNF': to_CNF, 'DNF': to_DNF, 'both': to_normal_forms}
+
+
+def _expand(tree, kind, budget=None, depth=0):
+    """
+    Shannon expansion shared by to_CNF, to_DNF and to_normal_forms.
+    When the budget is exceeded, every frame adds results of its completed branches
+    to the partial result of the exception, so it stays sound for the whole formula.
     """
+    if budget is not None:
+        budget.step(depth)
     if isinstance(tree, (bool, CustomBool)):
-        return bool(tree)
+        return (bool(tree), bool(tree)) if kind == 'both' else bool(tree)
 
     # Formula that is not bool constant, always has at least one variable
     variable = pick_variable(tree)
-
-    subclauses1 = to_CNF(tree.subs(variable, False))
+    results = {}
+    for value in (False, True):
+        try:
+            results[value] = _expand(tree.subs(variable, value), kind, budget, depth + 1)
+        except BudgetExceeded as ex:
+            results[value] = UNKNOWN[kind] if ex.partial is None else ex.partial
+            ex.partial = _join(kind, variable, results.get(False, UNKNOWN[kind]), results.get(True, UNKNOWN[kind]))
+            raise
+    result = _join(kind, variable, results[False], results[True])
+    if budget is not None:
+        budget.check_clauses(_count(result), result)
+    return result
+
+
+def _join(kind, variable, result_false, result_true):
+    if kind == 'CNF':
+        return join_CNF(variable, result_false, result_true)
+    elif kind == 'DNF':
+        return join_DNF(variable, result_false, result_true)
+    return (join_DNF(variable, result_false[0], result_true[0]),
+            join_CNF(variable, result_false[1], result_true[1]))
+
+
+def _count(result):
+    if isinstance(result, tuple):
+        return sum(map(_count, result))
+    return 0 if isinstance(result, bool) else len(result)
+
+
+def join_CNF(variable, result_false, result_true):
+    r"""
+    Returns CNF of (variable \/ A0) /\ (~variable \/ A1),
+    where result_false and result_true are CNFs of A0 and A1 respectively.
+    """
     # Check some degenerate cases
-    if subclauses1 is True:
-        subclauses1 = set()
-    elif subclauses1 is False:
-        subclauses1 = {frozenset({variable})}
+    if result_false is True:
+        result_false = set()
+    elif result_false is False:
+        result_false = {frozenset({variable})}
     else:
-        subclauses1 = {clause | {variable} for clause in subclauses1}
+        result_false = {clause | {variable} for clause in result_false}
 
-    subclauses2 = to_CNF(tree.subs(variable, True))
     # Check some degenerate cases
-    if subclauses2 is True:
-        subclauses2 = set()
-    elif subclauses2 is False:
-        subclauses2 = {frozenset({~variable})}
+    if result_true is True:
+        result_true = set()
+    elif result_true is False:
+        result_true = {frozenset({~variable})}
     else:
-        subclauses2 = {clause | {~variable} for clause in subclauses2}
+        result_true = {clause | {~variable} for clause in result_true}
 
-    result = subclauses1 | subclauses2
+    result = result_false | result_true
     if result == set():
         return True
     elif result == {frozenset({variable}), frozenset({~variable})}:
@@ -41,38 +120,28 @@ def to_CNF(tree):
         return result
 
 
-def to_DNF(tree):
-    """
-    Builds DNF for the given formula and returns it as the set of sets.
-    Computing DNF uses the following equality:
-    A(x, y) = (x /\ A(1, y)) \/ (~x /\ A(0, y))
-    where y may be boolean vector (y_1, ..., y_k)
+def join_DNF(variable, result_false, result_true):
+    r"""
+    Returns DNF of (variable /\ A1) \/ (~variable /\ A0),
+    where result_false and result_true are DNFs of A0 and A1 respectively.
     """
-    if isinstance(tree, (bool, CustomBool)):
-        return bool(tree)
-
-    # Formula that is not bool constant, always has at least one variable
-    variable = pick_variable(tree)
-
-    subclauses1 = to_DNF(tree.subs(variable, True))
     # Check some degenerate cases
-    if subclauses1 is False:
-        subclauses1 = set()
-    elif subclauses1 is True:
-        subclauses1 = {frozenset({variable})}
+    if result_true is False:
+        result_true = set()
+    elif result_true is True:
+        result_true = {frozenset({variable})}
     else:
-        subclauses1 = {clause | {variable} for clause in subclauses1}
+        result_true = {clause | {variable} for clause in result_true}
 
-    subclauses2 = to_DNF(tree.subs(variable, False))
     # Check some degenerate cases
-    if subclauses2 is False:
-        subclauses2 = set()
-    elif subclauses2 is True:
-        subclauses2 = {frozenset({~variable})}
+    if result_false is False:
+        result_false = set()
+    elif result_false is True:
+        result_false = {frozenset({~variable})}
     else:
-        subclauses2 = {clause | {~variable} for clause in subclauses2}
+        result_false = {clause | {~variable} for clause in result_false}
 
-    result = subclauses1 | subclauses2
+    result = result_true | result_false
     if result == set():
         return False
     elif result == {frozenset({variable}), frozenset({~variable})}:
@@ -155,4 +224,12 @@ def optimize_clauses(clauses, default_value=None, recursive=True):
     elif not recursive or result == clauses:
         return result
     else:
-        return optimize_clauses(result, default_value, recursive)
\ No newline at end of file
+        return optimize_clauses(result, default_value, recursive)
+
+
+def optimize_normal_forms(dnf, cnf):
+    """
+    Optimizes the pair of DNF and CNF returned by to_normal_forms.
+    Degenerate DNF is replaced with 1 and degenerate CNF is replaced with 0.
+    """
+    return optimize_clauses(dnf, True), optimize_clauses(cnf, False)
\ No newline at end of file
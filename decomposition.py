@@ -0,0 +1,269 @@
+import operator
+from concurrent.futures import ProcessPoolExecutor
+from functools import reduce
+
+from bool_types import *
+from convertation import CONVERTERS
+from exceptions import BudgetExceeded
+from serialization import encode_formula, decode_formula, encode_clauses, decode_clauses
+
+# Components with at least this number of variables are converted in separate processes.
+PARALLEL_THRESHOLD = 16
+
+MAIN_OPERATORS = {'CNF': BinaryConjunction, 'DNF': BinaryDisjunction}
+
+
+class DecompositionStatistics:
+    """
+    Collects information about components found during conversion.
+    components holds the number of variables of every component that was converted as a whole.
+    Components sent to worker processes are recorded (and counted in parallel) as a whole,
+    even if the worker splits them further, since workers do not report their statistics back.
+    """
+    def __init__(self):
+        self.components = []
+        self.parallel = 0
+
+    @property
+    def largest(self):
+        return max(self.components, default=0)
+
+    def __repr__(self):
+        return 'components: {}, largest: {} variables, parallel: {}'.format(
+            len(self.components), self.largest, self.parallel)
+
+
+def split(tree, cls):
+    """
+    Returns list of operands of the top-level chain of cls operators (BinaryConjunction or BinaryDisjunction).
+    Negations of other operators are expanded using De Morgan laws, e.g. ~(A \\/ B) is split to ~A and ~B.
+    """
+    parts = []
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, cls):
+            stack += [node.right, node.left]
+        elif cls is BinaryConjunction and isinstance(node, NegationOperator) \
+                and isinstance(node.value, BinaryDisjunction):
+            stack += [~node.value.right, ~node.value.left]
+        elif cls is BinaryConjunction and isinstance(node, NegationOperator) \
+                and isinstance(node.value, BinaryImplication):
+            stack += [~node.value.right, node.value.left]
+        elif cls is BinaryDisjunction and isinstance(node, NegationOperator) \
+                and isinstance(node.value, BinaryConjunction):
+            stack += [~node.value.right, ~node.value.left]
+        elif cls is BinaryDisjunction and isinstance(node, BinaryImplication):
+            stack += [node.right, ~node.left]
+        else:
+            parts.append(node)
+    return parts
+
+
+def variables(tree):
+    """
+    Returns the set of variables presented in the given formula.
+    """
+    result = set()
+    # Formulas may share subformulas, so each node is visited once.
+    visited = set()
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        if id(node) in visited:
+            continue
+        visited.add(id(node))
+        if isinstance(node, Variable):
+            result.add(node)
+        elif isinstance(node, NegationOperator):
+            stack.append(node.value)
+        elif isinstance(node, BinaryOperator):
+            stack += [node.left, node.right]
+    return result
+
+
+def components(tree, cls):
+    """
+    Splits the top-level chain of cls operators into groups with pairwise disjoint variable sets.
+    Returns list of pairs (formula, variables) where formula joins the group by cls.
+    """
+    parts = split(tree, cls)
+    # Union-find over parts: parts sharing a variable are merged through the first part that contains it.
+    parent = list(range(len(parts)))
+    owners = {}
+
+    def find(index):
+        while parent[index] != index:
+            parent[index] = index = parent[parent[index]]
+        return index
+
+    part_variables = [variables(part) for part in parts]
+    for index, names in enumerate(part_variables):
+        for variable in names:
+            owner = owners.setdefault(variable, index)
+            parent[find(owner)] = find(index)
+
+    groups = {}
+    for index, part in enumerate(parts):
+        group = groups.setdefault(find(index), ([], set()))
+        group[0].append(part)
+        group[1].update(part_variables[index])
+    return [(reduce(cls, group_parts), group_variables) for group_parts, group_variables in groups.values()]
+
+
+def _as_set(clauses, kind):
+    # For CNF True is the empty conjunction and False is the empty clause; DNF is dual.
+    if isinstance(clauses, bool):
+        return set() if clauses == (kind == 'CNF') else {frozenset()}
+    return clauses
+
+
+def _as_result(clauses, kind):
+    if not clauses:
+        return kind == 'CNF'
+    if frozenset() in clauses:
+        return kind != 'CNF'
+    return clauses
+
+
+def _union(results, budget=None):
+    union = set()
+    for result in results:
+        union |= result
+        if budget is not None:
+            budget.spend(len(result))
+    return union
+
+
+def _product(results, budget=None):
+    def join(first, second):
+        product = set()
+        for a in first:
+            product.update(a | b for b in second)
+            # Check the budget once per row, so a huge product is interrupted in time.
+            if budget is not None:
+                budget.spend(len(second))
+        return product
+    return reduce(join, results)
+
+
+def _convert(tree, kinds, executor=None, threshold=PARALLEL_THRESHOLD, statistics=None, budget=None):
+    """
+    Converts the given formula to normal forms of the given kinds ('CNF' or 'DNF')
+    and returns tuple of sets of clauses (never bool) in the same order.
+    Components of the top-level chain that share no variables are converted independently:
+    their results are joined by union for the main operator of the normal form,
+    and by pairwise product for the dual operator.
+    """
+    if isinstance(tree, (bool, CustomBool)):
+        return tuple(_as_set(bool(tree), kind) for kind in kinds)
+
+    for cls in (BinaryConjunction, BinaryDisjunction):
+        parts = components(tree, cls)
+        if len(parts) > 1:
+            futures, results = [], []
+            try:
+                for part, part_variables in parts:
+                    if executor is not None and len(part_variables) >= threshold:
+                        futures.append(executor.submit(_convert_encoded, encode_formula(part), kinds, budget))
+                        if statistics is not None:
+                            statistics.components.append(len(part_variables))
+                            statistics.parallel += 1
+                    else:
+                        results.append(_convert(part, kinds, executor, threshold, statistics, budget))
+                for future in futures:
+                    results.append(tuple(_as_set(decode_clauses(data), kind)
+                                         for data, kind in zip(future.result(), kinds)))
+            except BudgetExceeded:
+                # Results of other components are useless now, so do not start pending ones.
+                for future in futures:
+                    future.cancel()
+                raise
+            joins = [_union if MAIN_OPERATORS[kind] is cls else _product for kind in kinds]
+            if budget is not None:
+                # Check the size before the product is built, since it may be huge.
+                budget.check_clauses(sum(
+                    sum(len(result[i]) for result in results) if join is _union
+                    else reduce(operator.mul, (len(result[i]) for result in results))
+                    for i, join in enumerate(joins)
+                ))
+            return tuple(join([result[i] for result in results], budget) for i, join in enumerate(joins))
+
+    if statistics is not None:
+        statistics.components.append(len(variables(tree)))
+    if len(kinds) > 1:
+        forms = dict(zip(('DNF', 'CNF'), CONVERTERS['both'](tree, budget)))
+    else:
+        forms = {kind: CONVERTERS[kind](tree, budget) for kind in kinds}
+    return tuple(_as_set(forms[kind], kind) for kind in kinds)
+
+
+def _convert_encoded(data, kinds, budget=None):
+    """
+    Entry point for worker processes: formulas and results are passed in the binary format.
+    """
+    try:
+        results = _convert(decode_formula(data), kinds, budget=budget)
+    except BudgetExceeded as ex:
+        # Partial result is meaningless for the whole formula and cannot be pickled back to the parent.
+        ex.partial = None
+        raise
+    return tuple(encode_clauses(_as_result(result, kind)) for result, kind in zip(results, kinds))
+
+
+def _convert_components(tree, kinds, parallel, threshold, statistics, budget):
+    try:
+        if not parallel:
+            results = _convert(tree, kinds, None, threshold, statistics, budget)
+        elif isinstance(parallel, bool):
+            large = [part for cls in (BinaryConjunction, BinaryDisjunction)
+                     for part, part_variables in components(tree, cls) if len(part_variables) >= threshold]
+            if len(large) < 2:
+                results = _convert(tree, kinds, None, threshold, statistics, budget)
+            else:
+                executor = ProcessPoolExecutor()
+                try:
+                    results = _convert(tree, kinds, executor, threshold, statistics, budget)
+                except BaseException:
+                    # Running workers cannot be interrupted, so do not wait for them.
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    raise
+                executor.shutdown()
+        else:
+            results = _convert(tree, kinds, parallel, threshold, statistics, budget)
+    except BudgetExceeded as ex:
+        # Partial result of a single component says nothing about the whole formula.
+        ex.partial = None
+        raise
+    return tuple(_as_result(result, kind) for result, kind in zip(results, kinds))
+
+
+def to_CNF_components(tree, parallel=True, threshold=PARALLEL_THRESHOLD, statistics=None, budget=None):
+    """
+    Builds CNF for the given formula like to_CNF, but converts variable-disjoint parts independently:
+    CNF(A /\\ B) = CNF(A) | CNF(B) and CNF(A \\/ B) = {a | b for a in CNF(A) for b in CNF(B)}.
+
+    Components with at least threshold variables are converted in parallel:
+    parallel may be an executor to use, True to start process pool when it is worth it, or False.
+    If statistics is a DecompositionStatistics instance, it is filled with information about components.
+    If budget is given, conversion raises BudgetExceeded (without partial result) when it is exceeded.
+    Pending components are cancelled then, but the running ones cannot be interrupted:
+    give the budget a timeout to bound the time that worker processes may keep running.
+    """
+    return _convert_components(tree, ('CNF',), parallel, threshold, statistics, budget)[0]
+
+
+def to_DNF_components(tree, parallel=True, threshold=PARALLEL_THRESHOLD, statistics=None, budget=None):
+    """
+    Builds DNF for the given formula like to_DNF, but converts variable-disjoint parts independently.
+    See to_CNF_components for the description of arguments.
+    """
+    return _convert_components(tree, ('DNF',), parallel, threshold, statistics, budget)[0]
+
+
+def to_normal_forms_components(tree, parallel=True, threshold=PARALLEL_THRESHOLD, statistics=None, budget=None):
+    """
+    Builds the pair (DNF, CNF) like to_normal_forms, but converts variable-disjoint parts independently.
+    See to_CNF_components for the description of arguments.
+    """
+    return _convert_components(tree, ('DNF', 'CNF'), parallel, threshold, statistics, budget)
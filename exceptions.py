@@ -1,10 +1,26 @@
 class CustomException(Exception):
     """
-    Base exception class for lexer and parser
+    Base exception class for lexer, parser and conversion
     """
 
 
-class LexerException(CustomException):
+class PositionedException(CustomException):
+    """
+    Base class for exceptions that refer to some position in the input string.
+    The position is an offset of the offending token, or None if it is unknown (e.g. EOF).
+    """
+    def __init__(self, value, position=None):
+        super().__init__(value)
+        self.position = position
+
+    def __str__(self):
+        message = super().__str__()
+        if self.position is not None:
+            message += ' (position {})'.format(self.position)
+        return message
+
+
+class LexerException(PositionedException):
     """
     Raised when lexer finds an unexpected character
     """
@@ -12,9 +28,24 @@ class LexerException(CustomException):
         return 'Illegal character: ' + super().__str__()
 
 
-class ParserException(CustomException):
+class ParserException(PositionedException):
     """
     Raised when an error occurs during parsing process
     """
     def __str__(self):
         return 'Syntax error at: ' + super().__str__()
+
+
+class BudgetExceeded(CustomException):
+    """
+    Raised when conversion exceeds one of the limits of its Budget.
+    partial holds the result collected before the limit was hit, or None if it is unknown.
+    """
+    def __init__(self, resource, limit, partial=None):
+        super().__init__(resource, limit)
+        self.resource = resource
+        self.limit = limit
+        self.partial = partial
+
+    def __str__(self):
+        return 'Budget exceeded: {} limit {}'.format(self.resource, self.limit)
@@ -2,22 +2,39 @@
 from ply.lex import lex
 from ply import yacc
 
+from backends import convert
+from budget import Budget
 from exceptions import CustomException
 from convertation import *
 from token_definitions import *
+from tokenizer import Tokenizer
 
 lex()
 yacc.yacc()
 
+# Wall-clock limit of the conversion of one formula in REPL, in seconds.
+TIMEOUT = 10
+
+
+def parse(text, symbols=None):
+    """
+    Parses the given string using the regex-based Tokenizer.
+    All occurrences of one variable name share the same Variable object;
+    pass a SymbolTable as symbols to share variables between several calls.
+    """
+    return yacc.parse(text, lexer=Tokenizer(symbols))
+
+
 if __name__ == '__main__':
     while True:
         try:
             s = input('> ')
             if not s:
                 continue
-            parsed = yacc.parse(s)
-            print('DNF: ', dnf_to_string(optimize_clauses(to_DNF(parsed), True)))
-            print('CNF: ', cnf_to_string(optimize_clauses(to_CNF(parsed), False)))
+            parsed = parse(s)
+            dnf, cnf = optimize_normal_forms(*convert(parsed, 'both', budget=Budget(timeout=TIMEOUT)))
+            print('DNF: ', dnf_to_string(dnf))
+            print('CNF: ', cnf_to_string(cnf))
         except EOFError:
             # add new line in output
             print()
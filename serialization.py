@@ -0,0 +1,255 @@
+import struct
+import sys
+from array import array
+
+from bool_types import *
+
+FORMULA_MAGIC = b'BF\x01'
+CLAUSES_MAGIC = b'BC\x01'
+
+# Opcodes of the formula stream. Constants and variables push a value onto the stack,
+# operators pop their arguments and push the result, OP_REF pushes previously built subformula.
+OP_FALSE, OP_TRUE, OP_VARIABLE, OP_REF, OP_NOT, OP_AND, OP_OR, OP_IMPLIES = range(8)
+
+BINARY_OPCODES = {
+    BinaryConjunction: OP_AND,
+    BinaryDisjunction: OP_OR,
+    BinaryImplication: OP_IMPLIES,
+}
+BINARY_OPERATORS = {opcode: cls for cls, opcode in BINARY_OPCODES.items()}
+
+# Kinds of encoded clause sets: to_CNF and to_DNF return bool for degenerate formulas.
+CLAUSES_FALSE, CLAUSES_TRUE, CLAUSES_SET = range(3)
+
+_uint32 = struct.Struct('<I')
+_opcode_with_operand = struct.Struct('<BI')
+
+
+def _write_symbols(buffer, variables):
+    buffer += _uint32.pack(len(variables))
+    for variable in variables:
+        name = variable.letter.encode('utf-8')
+        buffer += _uint32.pack(len(name))
+        buffer += name
+
+
+def _read_symbols(view, offset):
+    """
+    Reads symbol table starting at the given offset.
+    Returns list of Variable objects (one per name) and the offset just after the table.
+    """
+    try:
+        (count,) = _uint32.unpack_from(view, offset)
+        offset += 4
+        variables = []
+        for _ in range(count):
+            (length,) = _uint32.unpack_from(view, offset)
+            offset += 4
+            if offset + length > len(view):
+                raise ValueError('Truncated symbol table')
+            variables.append(Variable(str(view[offset:offset + length], 'utf-8')))
+            offset += length
+    except struct.error:
+        raise ValueError('Truncated symbol table')
+    return variables, offset
+
+
+def _check_magic(view, magic):
+    if view[:len(magic)] != magic:
+        raise ValueError('Unknown format')
+    return len(magic)
+
+
+def encode_formula(tree):
+    """
+    Encodes the given formula as bytes.
+
+    The result consists of the symbol table and the postorder opcode stream.
+    Equal subformulas are written only once, every next occurrence is a back-reference.
+    The tree is traversed without recursion, so arbitrarily deep formulas are supported.
+    """
+    symbols = {}
+    # Maps structure of the subformula (opcode and identities of arguments) to its value index.
+    values = {}
+    # Maps id of already processed node to its identity; the node is stored to keep the id valid.
+    processed = {}
+    code = bytearray()
+    results = []
+    stack = [(tree, None)]
+    while stack:
+        node, mark = stack.pop()
+        if id(node) in processed:
+            identity = processed[id(node)][1]
+            if isinstance(identity, int):
+                code += _opcode_with_operand.pack(OP_REF, identity)
+            else:
+                code += _encode_leaf(identity)
+            results.append(identity)
+            continue
+
+        if isinstance(node, (bool, CustomBool)):
+            identity = ('constant', bool(node))
+            code += _encode_leaf(identity)
+        elif isinstance(node, Variable):
+            identity = ('variable', symbols.setdefault(node, len(symbols)))
+            code += _encode_leaf(identity)
+        elif mark is None:
+            stack.append((node, len(code)))
+            if isinstance(node, NegationOperator):
+                stack.append((node.value, None))
+            elif isinstance(node, BinaryOperator):
+                stack.append((node.right, None))
+                stack.append((node.left, None))
+            else:
+                raise TypeError
+            continue
+        else:
+            if isinstance(node, NegationOperator):
+                key = (OP_NOT, results.pop())
+            else:
+                right = results.pop()
+                left = results.pop()
+                key = (BINARY_OPCODES[type(node)], left, right)
+            identity = values.get(key)
+            if identity is None:
+                identity = values[key] = len(values)
+                code.append(key[0])
+            else:
+                # Arguments of a known subformula are known too, so only back-references were written for them.
+                del code[mark:]
+                code += _opcode_with_operand.pack(OP_REF, identity)
+        processed[id(node)] = (node, identity)
+        results.append(identity)
+
+    buffer = bytearray(FORMULA_MAGIC)
+    _write_symbols(buffer, list(symbols))
+    buffer += code
+    return bytes(buffer)
+
+
+def _encode_leaf(identity):
+    kind, value = identity
+    if kind == 'constant':
+        return bytes([OP_TRUE if value else OP_FALSE])
+    return _opcode_with_operand.pack(OP_VARIABLE, value)
+
+
+def decode_formula(data):
+    """
+    Decodes formula from the result of encode_formula.
+    Accepts any bytes-like object; memoryview is read in place without copying.
+    Back-references are decoded as shared objects, so the result may be a DAG.
+    """
+    view = memoryview(data)
+    offset = _check_magic(view, FORMULA_MAGIC)
+    variables, offset = _read_symbols(view, offset)
+    values = []
+    stack = []
+    try:
+        while offset < len(view):
+            opcode = view[offset]
+            offset += 1
+            if opcode == OP_FALSE or opcode == OP_TRUE:
+                stack.append(CustomBool(opcode == OP_TRUE))
+            elif opcode == OP_VARIABLE or opcode == OP_REF:
+                (operand,) = _uint32.unpack_from(view, offset)
+                offset += 4
+                stack.append(variables[operand] if opcode == OP_VARIABLE else values[operand])
+            elif opcode == OP_NOT:
+                node = NegationOperator(stack.pop())
+                values.append(node)
+                stack.append(node)
+            elif opcode in BINARY_OPERATORS:
+                right = stack.pop()
+                left = stack.pop()
+                node = BINARY_OPERATORS[opcode](left, right)
+                values.append(node)
+                stack.append(node)
+            else:
+                raise ValueError('Unknown opcode: {}'.format(opcode))
+    except (IndexError, struct.error):
+        raise ValueError('Malformed formula stream')
+    if len(stack) != 1:
+        raise ValueError('Malformed formula stream')
+    return stack[0]
+
+
+def encode_clauses(clauses):
+    """
+    Encodes the return value of to_CNF or to_DNF as bytes.
+
+    Literals are packed as int32 numbers: index of the variable in the symbol table plus one,
+    negated for negative literals. Every clause is terminated by zero.
+    """
+    buffer = bytearray(CLAUSES_MAGIC)
+    if isinstance(clauses, (bool, CustomBool)):
+        buffer.append(CLAUSES_TRUE if clauses else CLAUSES_FALSE)
+        return bytes(buffer)
+    buffer.append(CLAUSES_SET)
+
+    symbols = {}
+    literals = array('i')
+    for clause in clauses:
+        for literal in clause:
+            if isinstance(literal, Variable):
+                literals.append(symbols.setdefault(literal, len(symbols)) + 1)
+            elif isinstance(literal, NegationOperator) and isinstance(literal.value, Variable):
+                literals.append(-symbols.setdefault(literal.value, len(symbols)) - 1)
+            else:
+                raise TypeError
+        literals.append(0)
+    if sys.byteorder != 'little':
+        literals.byteswap()
+
+    _write_symbols(buffer, list(symbols))
+    # Align literals, so they may be viewed as int32 array in place.
+    buffer += bytes(-len(buffer) % literals.itemsize)
+    buffer += literals.tobytes()
+    return bytes(buffer)
+
+
+def decode_clauses(data):
+    """
+    Decodes clause set from the result of encode_clauses.
+    Accepts any bytes-like object; memoryview is read in place without copying.
+    """
+    view = memoryview(data)
+    offset = _check_magic(view, CLAUSES_MAGIC)
+    if offset >= len(view):
+        raise ValueError('Truncated clause set')
+    kind = view[offset]
+    if kind == CLAUSES_FALSE or kind == CLAUSES_TRUE:
+        if offset + 1 != len(view):
+            raise ValueError('Trailing data after constant clause set')
+        return kind == CLAUSES_TRUE
+    elif kind != CLAUSES_SET:
+        raise ValueError('Unknown clause set kind: {}'.format(kind))
+    variables, offset = _read_symbols(view, offset + 1)
+    offset += -offset % 4
+    if (len(view) - offset) % 4:
+        raise ValueError('Truncated clause set')
+
+    if sys.byteorder == 'little':
+        literals = view[offset:].cast('i')
+    else:
+        literals = array('i')
+        literals.frombytes(view[offset:])
+        literals.byteswap()
+
+    negated = [~variable for variable in variables]
+    clauses = set()
+    clause = []
+    try:
+        for literal in literals:
+            if literal > 0:
+                clause.append(variables[literal - 1])
+            elif literal < 0:
+                clause.append(negated[-literal - 1])
+            else:
+                clauses.add(frozenset(clause))
+                clause = []
+    except IndexError:
+        raise ValueError('Unknown variable in clause set')
+    if clause:
+        raise ValueError('Truncated clause set')
+    return clauses
@@ -4,10 +4,20 @@ import itertools
 import operator
 import unittest
 
+from ply import lex
+
+from aig import AIG, FALSE, TRUE, simplify
+from backends import convert, select_backend, size
 from bool_types import *
+from budget import Budget
 from convertation import *
-from parser import yacc
-from exceptions import LexerException, ParserException
+from decomposition import DecompositionStatistics, components, to_CNF_components, to_DNF_components, \
+    to_normal_forms_components
+from parser import yacc, parse
+from tokenizer import SymbolTable, Tokenizer
+import token_definitions
+from exceptions import BudgetExceeded, LexerException, ParserException
+from serialization import encode_formula, decode_formula, encode_clauses, decode_clauses
 
 
 p, q, r = Variable('p'), Variable('q'), Variable('r')
@@ -250,6 +260,42 @@ class TestParser(unittest.TestCase):
         )
 
 
+class TestTokenizer(unittest.TestCase):
+    def tokens(self, lexer, line):
+        lexer.input(line)
+        return [(token.type, token.value, token.lexpos) for token in iter(lexer.token, None)]
+
+    def test_same_as_ply(self):
+        inputs = ['p', '1p->q', r'(p->q) /\ (q->s) \/ ~r_1', r'x\/0/\ 1', '  \t a  ', '']
+        for line in inputs:
+            with self.subTest(line):
+                self.assertEqual(self.tokens(Tokenizer(), line), self.tokens(lex.lex(module=token_definitions), line))
+
+    def test_parse(self):
+        formula = r'(p->q) /\ (q->s) /\ (s->r) /\ (r->~p) /\ p'
+        self.assertEqual(parse(formula), yacc.parse(formula))
+        self.assertEqual(parse(r'p /\ ~p'), f)
+
+    def test_interning(self):
+        parsed = parse(r'(x /\ y) \/ (~x /\ ~y)')
+        self.assertIs(parsed.left.left, parsed.right.left.value)
+        self.assertIs(parsed.left.right, parsed.right.right.value)
+        symbols = SymbolTable()
+        self.assertIs(parse('x', symbols), parse('~x', symbols).value)
+        self.assertIsNot(parse('x'), parse('x'))
+
+    def test_positions(self):
+        with self.assertRaises(LexerException) as cm:
+            parse('p + 1')
+        self.assertEqual(cm.exception.position, 2)
+        with self.assertRaises(ParserException) as cm:
+            parse(r'p \/ /\ q')
+        self.assertEqual(cm.exception.position, 5)
+        with self.assertRaises(ParserException) as cm:
+            parse(r'p \/')
+        self.assertIsNone(cm.exception.position)
+
+
 class TestConvertation(unittest.TestCase):
     def test_extraction(self):
         self.assertIsNone(pick_variable(t))
@@ -303,6 +349,285 @@ class TestConvertation(unittest.TestCase):
         self.assertIsNone(optimize_clauses({frozenset({~p, q, r}), frozenset({p}), frozenset({~p})}))
         self.assertIsNone(optimize_clauses({frozenset({p}), frozenset({q}), frozenset({~p, ~q})}))
 
+    def test_normal_forms(self):
+        formulas = [t, f, p, ~p, p & ~q, p | ~q, (p & q) >> (r | (~q & p)), (p >> q) & (q >> r) & (r >> ~p) & p]
+        for formula in formulas:
+            with self.subTest(formula=formula):
+                self.assertEqual(to_normal_forms(formula), (to_DNF(formula), to_CNF(formula)))
+        self.assertEqual(optimize_normal_forms(*to_normal_forms(p & ~p)), (False, False))
+        self.assertEqual(optimize_normal_forms({frozenset({p}), frozenset({~p})}, {frozenset({p}), frozenset({~p})}),
+                         (True, False))
+
+
+class TestAIG(unittest.TestCase):
+    def assertEquivalent(self, first, second, variables):
+        for values in itertools.product([True, False], repeat=len(variables)):
+            expected, observed = first, second
+            for variable, value in zip(variables, values):
+                expected, observed = expected.subs(variable, value), observed.subs(variable, value)
+            self.assertIsInstance(observed, CustomBool)
+            self.assertEqual(expected, observed)
+
+    def test_structural_hashing(self):
+        graph = AIG(rewrite=False)
+        self.assertEqual(graph.build(p & q), graph.build(q & p))
+        self.assertEqual(graph.build(p | q), graph.build(~(~p & ~q)))
+        self.assertEqual(graph.build(p >> q), graph.build(~(p & ~q)))
+        self.assertEqual(len(graph), 3)
+        self.assertEqual(graph.build(t), TRUE)
+        self.assertEqual(graph.build(p & ~p), FALSE)
+
+    def test_rewriting(self):
+        graph = AIG()
+        self.assertEqual(graph.build((p & q) & ~p), FALSE)
+        self.assertEqual(graph.build((p & q) & q), graph.build(p & q))
+        self.assertEqual(graph.build(~(p & q) & p), graph.build(p & ~q))
+        self.assertEqual(graph.build(~(p & q) & ~q), graph.build(~q))
+        self.assertEqual(graph.build((p & q) & (~p & r)), FALSE)
+
+    def test_balancing(self):
+        variables = [Variable('x{}'.format(i)) for i in range(64)]
+        graph = AIG()
+        literal = graph.build(functools.reduce(operator.and_, variables))
+        self.assertEqual(graph.level(literal), 63)
+        balanced_graph, balanced = graph.balance(literal)
+        self.assertEqual(balanced_graph.level(balanced), 6)
+        self.assertEqual(balanced_graph.size(balanced), 63)
+        # Repeated leaves of one conjunction are merged.
+        literal = graph.build(functools.reduce(operator.and_, variables[::-1]) & functools.reduce(operator.and_, variables))
+        balanced_graph, balanced = graph.balance(literal)
+        self.assertEqual(balanced_graph.size(balanced), 63)
+
+    def test_simplify(self):
+        formulas = [
+            (p & q) >> (r | (~q & p)),
+            (p >> q) & (q >> r) & (r >> ~p) & p,
+            (p | q | r) & ~(p & q) & (p >> r),
+            ((p >> q) >> r) | ~(r & ~p),
+        ]
+        for formula in formulas:
+            with self.subTest(formula=formula):
+                simplified = simplify(formula)
+                self.assertEquivalent(formula, simplified, [p, q, r])
+                dnf = to_DNF(simplified)
+                if not isinstance(dnf, bool):
+                    dnf = functools.reduce(operator.or_, [functools.reduce(operator.and_, clause) for clause in dnf])
+                self.assertEquivalent(formula, CustomBool(dnf) if isinstance(dnf, bool) else dnf, [p, q, r])
+        self.assertEqual(simplify((p | q) & ~(p | q)), f)
+        self.assertIsInstance(simplify(p | q | r), BinaryDisjunction)
+
+    def test_simplify_size(self):
+        formulas = [
+            p >> q,
+            ~p >> ~q,
+            (p >> q) & (q >> r),
+            (p >> q) >> (q >> r),
+            p >> (q >> (r >> p)),
+            ~(p >> q) | (r >> ~p),
+        ]
+        for formula in formulas:
+            with self.subTest(formula=formula):
+                simplified = simplify(formula)
+                self.assertEquivalent(formula, simplified, [p, q, r])
+                self.assertLessEqual(size(simplified), size(formula))
+        self.assertEqual(size(simplify(p >> q)), 3)
+
+
+class TestSerialization(unittest.TestCase):
+    def test_formula(self):
+        formulas = [t, f, p, ~p, p & ~q, (p & q) >> (r | (~q & p)), Variable('long_name') | ~(p >> (q & r))]
+        for formula in formulas:
+            with self.subTest(formula=formula):
+                data = encode_formula(formula)
+                self.assertEqual(decode_formula(data), formula)
+                self.assertEqual(decode_formula(memoryview(bytearray(data))), formula)
+
+    def test_back_references(self):
+        shared = (p & q) | r
+        formula = shared & (shared >> ~(p & q))
+        data = encode_formula(formula)
+        self.assertLess(len(data), len(encode_formula(((p & q) | r) & (((p | q) & r) >> ~(p & q)))))
+        decoded = decode_formula(data)
+        self.assertEqual(decoded, formula)
+        self.assertIs(decoded.left, decoded.right.left)
+        self.assertIs(decoded.left.left, decoded.right.right.value)
+
+    def test_deep_formula(self):
+        variables = [Variable('x{}'.format(i)) for i in range(50000)]
+        decoded = decode_formula(encode_formula(functools.reduce(operator.and_, variables)))
+        for variable in reversed(variables[1:]):
+            self.assertEqual(decoded.right, variable)
+            decoded = decoded.left
+        self.assertEqual(decoded, variables[0])
+
+    def test_clauses(self):
+        for clauses in [True, False, to_CNF((p & q) >> (r | (~q & p))), to_DNF(p >> (q & ~r)), {frozenset()}]:
+            with self.subTest(clauses=clauses):
+                data = encode_clauses(clauses)
+                self.assertEqual(decode_clauses(memoryview(data)), clauses)
+
+    def test_malformed(self):
+        self.assertRaises(ValueError, decode_formula, b'junk')
+        self.assertRaises(ValueError, decode_formula, encode_formula(p & q)[:-1])
+        self.assertRaises(ValueError, decode_clauses, encode_clauses({frozenset({p, ~q})})[:-2])
+        self.assertRaises(ValueError, decode_clauses, b'BC\x01\x07')
+        self.assertRaises(ValueError, decode_clauses, encode_clauses(True) + b'\x00')
+
+
+class TestDecomposition(unittest.TestCase):
+    def assertEquivalent(self, formula, clauses, outer, inner):
+        variables = [Variable(name) for name in 'pqrstu']
+        if not isinstance(clauses, bool):
+            clauses = functools.reduce(outer, [functools.reduce(inner, clause) for clause in clauses])
+        for values in itertools.product([True, False], repeat=len(variables)):
+            expected, observed = formula, CustomBool(clauses) if isinstance(clauses, bool) else clauses
+            for variable, value in zip(variables, values):
+                expected, observed = expected.subs(variable, value), observed.subs(variable, value)
+            self.assertEqual(expected, observed)
+
+    def test_components(self):
+        s, u = Variable('s'), Variable('u')
+        parts = components((p >> q) & (r | s) & ~(u | ~p), BinaryConjunction)
+        self.assertEqual(sorted(len(part_variables) for _, part_variables in parts), [1, 2, 2])
+        parts = components((p & q) | (r >> s), BinaryDisjunction)
+        self.assertEqual(len(parts), 3)
+        self.assertEqual(len(components((p & q) | (q >> r), BinaryDisjunction)), 2)
+        self.assertEqual(len(components((p & q) | (q & r), BinaryDisjunction)), 1)
+        # A later part may connect groups that were disjoint so far.
+        self.assertEqual(len(components((p | q) & (r | s) & u & (q >> r), BinaryConjunction)), 2)
+
+    def test_conversion(self):
+        s, u = Variable('s'), Variable('u')
+        formulas = [
+            t, f, p, p & ~q,
+            (p >> q) & (r | s) & (u >> ~u),
+            ((p & q) | r) & ~(s >> u),
+            (p & q) | (r >> s) | ~(u | p),
+            ((p >> q) & (q >> p)) | ((r & s) >> u),
+        ]
+        for formula in formulas:
+            with self.subTest(formula=formula):
+                self.assertEquivalent(formula, to_CNF_components(formula, parallel=False), operator.and_, operator.or_)
+                self.assertEquivalent(formula, to_DNF_components(formula, parallel=False), operator.or_, operator.and_)
+                dnf, cnf = to_normal_forms_components(formula, parallel=False)
+                self.assertEqual(dnf, to_DNF_components(formula, parallel=False))
+                self.assertEqual(cnf, to_CNF_components(formula, parallel=False))
+
+    def test_statistics(self):
+        s, u = Variable('s'), Variable('u')
+        statistics = DecompositionStatistics()
+        cnf = to_CNF_components((p >> q) & (r | s) & u, parallel=False, statistics=statistics)
+        self.assertEqual(cnf, {frozenset({~p, q}), frozenset({r, s}), frozenset({u})})
+        # Disjunctions of distinct variables are split further, so every component has a single variable.
+        self.assertEqual(statistics.components, [1] * 5)
+        self.assertEqual(statistics.largest, 1)
+        self.assertEqual(statistics.parallel, 0)
+
+    def test_parallel(self):
+        s, u = Variable('s'), Variable('u')
+        formula = (p | (q & r)) & ((s >> u) | (u & ~s))
+        statistics = DecompositionStatistics()
+        cnf = to_CNF_components(formula, threshold=2, statistics=statistics)
+        self.assertEqual(statistics.parallel, 2)
+        # Components split by workers are not recorded.
+        self.assertEqual(statistics.components, [3, 2])
+        self.assertEquivalent(formula, cnf, operator.and_, operator.or_)
+
+
+class TestBudget(unittest.TestCase):
+    variables = [Variable('x{}'.format(i)) for i in range(8)]
+    formula = functools.reduce(operator.and_, [
+        a | b | ~c for a, b, c in zip(variables, variables[1:] + variables[:1], variables[2:] + variables[:2])
+    ])
+
+    def assignments(self):
+        for values in itertools.product([True, False], repeat=len(self.variables)):
+            formula = self.formula
+            for variable, value in zip(self.variables, values):
+                formula = formula.subs(variable, value)
+            yield dict(zip(self.variables, values)), formula
+
+    def satisfied(self, clause, assignment):
+        return any(assignment[literal] if isinstance(literal, Variable) else not assignment[literal.value]
+                   for literal in clause)
+
+    def test_unlimited(self):
+        self.assertEqual(to_CNF(self.formula, Budget()), to_CNF(self.formula))
+        self.assertEqual(to_DNF(self.formula, Budget()), to_DNF(self.formula))
+        self.assertEqual(to_normal_forms(self.formula, Budget()), to_normal_forms(self.formula))
+
+    def test_limits(self):
+        budgets = {
+            'clauses': Budget(max_clauses=5),
+            'depth': Budget(max_depth=3),
+            'nodes': Budget(max_nodes=20),
+            'timeout': Budget(timeout=0),
+        }
+        for resource, budget in budgets.items():
+            with self.subTest(resource):
+                with self.assertRaises(BudgetExceeded) as cm:
+                    to_CNF(self.formula, budget)
+                self.assertEqual(cm.exception.resource, resource)
+                self.assertIn(resource, str(cm.exception))
+
+    def test_partial(self):
+        cnf, complete = convert(self.formula, 'CNF', 'shannon', Budget(max_nodes=40), partial=True)
+        self.assertFalse(complete)
+        dnf, complete = convert(self.formula, 'DNF', 'shannon', Budget(max_nodes=40), partial=True)
+        self.assertFalse(complete)
+        self.assertEqual(convert(self.formula, 'CNF', 'shannon', Budget(), partial=True), (to_CNF(self.formula), True))
+        self.assertTrue(cnf)
+        self.assertTrue(dnf)
+        self.assertLess(len(cnf), len(to_CNF(self.formula)))
+        # Partial CNF is implied by the formula and partial DNF implies it.
+        for assignment, value in self.assignments():
+            if value:
+                self.assertTrue(all(self.satisfied(clause, assignment) for clause in cnf))
+            else:
+                self.assertFalse(any(all(self.satisfied({literal}, assignment) for literal in term) for term in dnf))
+
+    def test_backends(self):
+        s = Variable('s')
+        self.assertEqual(size(p & ~q), 4)
+        self.assertEqual(select_backend((p >> q) & (q >> r)), ('shannon', (p >> q) & (q >> r)))
+        self.assertEqual(select_backend((p >> q) & (r | s)), ('components', (p >> q) & (r | s)))
+        self.assertEqual(select_backend((p & q & ~p) | (q >> r))[0], 'aig')
+        self.assertEqual(select_backend((p & q & ~p) | (q >> r))[1], simplify((p & q & ~p) | (q >> r)))
+        for backend in ('auto', 'shannon', 'components', 'aig'):
+            with self.subTest(backend):
+                dnf, cnf = convert(self.formula, backend=backend, budget=Budget(timeout=60))
+                self.assertEqual(convert(self.formula, 'CNF', backend=backend), cnf)
+                for assignment, value in self.assignments():
+                    self.assertEqual(all(self.satisfied(clause, assignment) for clause in cnf), value)
+                    self.assertEqual(any(all(self.satisfied({literal}, assignment) for literal in term)
+                                         for term in dnf), value)
+        # Only Shannon expansion collects partial results.
+        self.assertTrue(convert(self.formula, 'DNF', 'shannon', Budget(max_nodes=20), partial=True)[0])
+        self.assertRaises(BudgetExceeded, convert, self.formula, 'DNF', 'components', Budget(max_nodes=20), partial=True)
+        self.assertRaises(BudgetExceeded, convert, self.formula, 'DNF', 'components', Budget(max_nodes=10))
+
+    def test_parallel(self):
+        # Negations in partial results cannot be pickled, so workers must not send them to the parent.
+        other = [Variable('y{}'.format(i)) for i in range(len(self.variables))]
+        formula = self.formula & functools.reduce(operator.and_, [
+            a | b | ~c for a, b, c in zip(other, other[1:] + other[:1], other[2:] + other[:2])
+        ])
+        for budget in (Budget(max_nodes=10), Budget(max_clauses=5), Budget(timeout=0)):
+            with self.subTest(budget=vars(budget)):
+                self.assertRaises(BudgetExceeded, to_normal_forms_components, formula, threshold=4, budget=budget)
+        self.assertRaises(ValueError, convert, self.formula, backend='unknown')
+        self.assertRaises(ValueError, convert, self.formula, 'ANF')
+
+    def test_joins(self):
+        # Every part is cheap, but the product of their DNFs has 2^6 terms.
+        other = [Variable('y{}'.format(i)) for i in range(12)]
+        formula = functools.reduce(operator.and_, [a | b for a, b in zip(other[::2], other[1::2])])
+        self.assertEqual(len(to_CNF_components(formula, parallel=False, budget=Budget(max_nodes=50))), 6)
+        with self.assertRaises(BudgetExceeded) as cm:
+            to_DNF_components(formula, parallel=False, budget=Budget(max_nodes=50))
+        self.assertEqual(cm.exception.resource, 'nodes')
+        self.assertEqual(select_backend(formula, 'CNF')[0], 'components')
+
 
 if __name__ == '__main__':
     unittest.main()
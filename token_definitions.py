@@ -33,7 +33,7 @@ def t_TERM(t):
 
 
 def t_error(t):
-    raise LexerException(t.value)
+    raise LexerException(t.value, t.lexpos)
 
 
 def p_expression_true(p):
@@ -54,7 +54,9 @@ def p_expression_term(p):
     """
     expression : TERM
     """
-    p[0] = Variable(p[1])
+    # Lexers providing a symbol table share one Variable object between all occurrences of a name.
+    symbols = getattr(p.lexer, 'symbols', None)
+    p[0] = symbols[p[1]] if symbols is not None else Variable(p[1])
 
 
 def p_expression_and(p):
@@ -93,4 +95,6 @@ def p_expression_group(p):
 
 
 def p_error(p):
-    raise ParserException(p.value if p else 'EOF')
+    if p:
+        raise ParserException(p.value, p.lexpos)
+    raise ParserException('EOF')
@@ -0,0 +1,76 @@
+import re
+
+from ply.lex import LexToken
+
+from bool_types import Variable
+from exceptions import LexerException
+from token_definitions import literals, t_ignore, t_TERM, t_AND, t_OR, t_NOT, t_IMPLIES, t_TRUE, t_FALSE
+
+
+class SymbolTable(dict):
+    """
+    Maps variable names to Variable objects, creating each Variable on the first lookup.
+    Therefore all occurrences of one name in a formula share the same Variable instance.
+    """
+    def __missing__(self, name):
+        variable = self[name] = Variable(name)
+        return variable
+
+
+class Tokenizer:
+    """
+    Tokenizer that is compatible with the ply lexer interface,
+    so it may be passed to yacc.parse as the lexer argument.
+
+    All token rules from token_definitions are combined into one compiled regular expression,
+    so every token together with the preceding ignored characters is recognized with exactly one match call.
+    Each call of input() starts a new symbol table, unless a shared one is given to the constructor.
+    """
+    # Order matters: longer operators must be tried before their prefixes, as ply does for string rules.
+    rules = (
+        ('TERM', t_TERM.__doc__),
+        ('IMPLIES', t_IMPLIES),
+        ('AND', t_AND),
+        ('OR', t_OR),
+        ('NOT', t_NOT),
+        ('TRUE', t_TRUE),
+        ('FALSE', t_FALSE),
+        ('LITERAL', '[{}]'.format(re.escape(literals))),
+        ('ERROR', '[^{}]'.format(re.escape(t_ignore))),
+    )
+    # Ignored characters are consumed by the same match as the following token.
+    pattern = re.compile('[{}]*(?:{})'.format(
+        re.escape(t_ignore), '|'.join('(?P<{}>{})'.format(name, regex) for name, regex in rules)
+    ), re.DOTALL)
+
+    def __init__(self, symbols=None):
+        self.shared_symbols = symbols
+        self.symbols = symbols
+        self.lexdata = ''
+        self.lexpos = 0
+        self.lineno = 1
+
+    def input(self, data):
+        self.lexdata = data
+        self.lexpos = 0
+        self.symbols = self.shared_symbols if self.shared_symbols is not None else SymbolTable()
+
+    def token(self):
+        match = self.pattern.match(self.lexdata, self.lexpos)
+        if match is None:
+            # Only ignored characters are left.
+            self.lexpos = len(self.lexdata)
+            return None
+        kind = match.lastgroup
+        self.lexpos = match.end()
+        token = LexToken()
+        token.value = value = match.group(kind)
+        token.lexpos = position = match.start(kind)
+        if kind == 'ERROR':
+            raise LexerException(self.lexdata[position:], position)
+        token.type = value if kind == 'LITERAL' else kind
+        token.lineno = self.lineno
+        return token
+
+    def __iter__(self):
+        return iter(self.token, None)